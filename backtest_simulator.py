@@ -1,153 +1,320 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
 import csv
 import os
+import weakref
+
+try:
+    import talib
+except ImportError:  # TA-Lib needs its C library installed; fall back to pandas
+    talib = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pv
+except ImportError:  # fall back to pandas' C parser
+    pa = None
+
+try:
+    from numba import njit
+except ImportError:  # run the scan as plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
 
 # === CONFIGURATION ===
 DATA_PATH = "historical_us30.csv"
 OUTPUT_PATH = "backtest_trades.csv"
+OUTPUT_PARQUET_PATH = "backtest_trades.parquet"   # written too when pyarrow is installed
 EQUITY_CURVE_PATH = "equity_curve.csv"
 PERFORMANCE_REPORT_PATH = "performance_report.txt"
+EQUITY_PLOT_PATH = "equity_curve.png"
+PLOT_EQUITY = os.environ.get("BACKTEST_PLOT", "1") == "1"   # BACKTEST_PLOT=0 skips matplotlib entirely
 COMMISSION = 0.5   # $ per trade
 SLIPPAGE = 0.5      # points
 CONTRACT_SIZE = 1
 QUARTER_GAP = 250
 BREAK_CONFIRMATION = 50
 ATR_PERIOD = 14
+EMA_SPAN = 50
 ATR_MULTIPLIER = 1.5
 TP_MULTIPLIER = 3.0
 INITIAL_BALANCE = 10000
+PRICE_DTYPE = np.float32   # signal-mask precision only; prices, fills, ATR and PnL stay float64
+INDICATOR_CACHE_SIZE = 8   # price frames whose EMA/ATR are kept for parameter sweeps
+
+# === DATA ===
+PRICE_COLUMNS = ['Time', 'Open', 'High', 'Low', 'Close']
+
+def load_price_history(path):
+    """Read the OHLC history with parsed timestamps, skipping any extra columns."""
+    if pa is not None:
+        # Multi-threaded Arrow parse with a fixed schema; no dtype inference pass
+        column_types = {'Time': pa.timestamp('ns'), **{c: pa.float64() for c in PRICE_COLUMNS[1:]}}
+        table = pv.read_csv(path, convert_options=pv.ConvertOptions(column_types=column_types, include_columns=PRICE_COLUMNS))
+        return table.to_pandas()
+
+    return pd.read_csv(path, usecols=PRICE_COLUMNS, parse_dates=['Time'], dtype={c: np.float64 for c in PRICE_COLUMNS[1:]})
+
+# === INDICATORS ===
+def wilder_atr(high, low, close, period):
+    """Wilder ATR (SMA-seeded, same output as talib.ATR). First `period` values are NaN."""
+    if talib is not None:
+        return talib.ATR(high, low, close, period)
+
+    prev_close = np.roll(close, 1)
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    atr = np.full_like(close, np.nan)
+    if len(close) > period:
+        # Seed with the mean of the first `period` true ranges, then Wilder smoothing (alpha = 1/period)
+        smoothed = tr[period:].copy()
+        smoothed[0] = tr[1:period + 1].mean()
+        atr[period:] = pd.Series(smoothed).ewm(alpha=1.0 / period, adjust=False).mean().to_numpy()
+    return atr
+
+_indicator_cache = {}   # id(df) -> (weakref to df, indicators)
+
+def compute_indicators(df):
+    """
+    EMA/ATR arrays for a price frame, memoized per frame object so a parameter sweep over the
+    same history runs the indicator pass once. Arrays are read-only; don't mutate a cached frame.
+    """
+    hit = _indicator_cache.get(id(df))
+    if hit is not None and hit[0]() is df:
+        return hit[1]
+
+    # float32 copies feed only the break masks; fills come from the float64 close, so
+    # float32 rounding never reaches prices or PnL
+    fill_close = df['Close'].to_numpy(dtype=np.float64)
+    close = fill_close.astype(PRICE_DTYPE)
+    ema = df['Close'].ewm(span=EMA_SPAN, adjust=False).mean().to_numpy(dtype=PRICE_DTYPE)
+    atr = wilder_atr(df['High'].to_numpy(dtype=np.float64), df['Low'].to_numpy(dtype=np.float64),
+                     fill_close, ATR_PERIOD)
+    ind = {"time": df['Time'].to_numpy(), "close": close, "fill_close": fill_close, "ema": ema, "atr": atr}
+    for arr in ind.values():
+        arr.flags.writeable = False
+
+    if len(_indicator_cache) >= INDICATOR_CACHE_SIZE:
+        _indicator_cache.pop(next(iter(_indicator_cache)))
+    _indicator_cache[id(df)] = (weakref.ref(df), ind)
+    return ind
 
 # === STRATEGY ===
+# Event codes emitted by _scan_positions; they index the lookup arrays below
+EV_BUY, EV_SELL, EV_EXIT_LONG, EV_EXIT_SHORT = 0, 1, 2, 3
+EVENT_ACTIONS = np.array(['BUY', 'SELL', 'EXIT_LONG', 'EXIT_SHORT'])
+ACTION_DTYPE = pd.CategoricalDtype(EVENT_ACTIONS)   # Action column: 1-byte codes instead of strings
+EVENT_SLIPPAGE_SIGN = np.array([1.0, -1.0, -1.0, 1.0])   # fills are worse by SLIPPAGE in the trade direction
+EVENT_SIDE = np.array([1.0, -1.0, 0.0, 0.0])             # +1 long entry, -1 short entry, 0 exit
+
+@njit(cache=True)
+def _scan_positions(long_break, short_break, position):
+    """
+    Sequential position state machine over the break signals.
+    `position` is the starting state (1 long, -1 short, 0 flat).
+    Returns (bar indices, event codes, final position); an exit and its reversal share a bar.
+    """
+    n = long_break.shape[0]
+    out_idx = np.empty(2 * n, np.int64)
+    out_event = np.empty(2 * n, np.int8)
+    k = 0
+    for i in range(n):
+        if long_break[i] and position != 1:
+            if position == -1:
+                out_idx[k] = i
+                out_event[k] = EV_EXIT_SHORT
+                k += 1
+            out_idx[k] = i
+            out_event[k] = EV_BUY
+            k += 1
+            position = 1
+        elif short_break[i] and position != -1:
+            if position == 1:
+                out_idx[k] = i
+                out_event[k] = EV_EXIT_LONG
+                k += 1
+            out_idx[k] = i
+            out_event[k] = EV_SELL
+            k += 1
+            position = -1
+    return out_idx[:k], out_event[:k], position
+
+def break_signals(ind, quarter_gap, break_confirmation):
+    """Long/short break masks for every bar; prev close is checked against the current bar's levels."""
+    close, ema = ind["close"], ind["ema"]
+    base = np.floor(close / quarter_gap) * quarter_gap
+    up_thr = base + (quarter_gap + break_confirmation)
+    dn_thr = base - break_confirmation
+
+    # Previous close is compared through shifted slices, so no shifted copy of `close` is made;
+    # bar 0 has no previous close but falls inside the ATR warm-up mask below
+    long_break = close > up_thr
+    long_break[1:] &= close[:-1] > up_thr[1:]
+    long_break &= close > ema
+    short_break = close < dn_thr
+    short_break[1:] &= close[:-1] < dn_thr[1:]
+    short_break &= close < ema
+
+    long_break[:ATR_PERIOD] = False
+    short_break[:ATR_PERIOD] = False
+    return long_break, short_break
+
 class QuarterPointStrategy:
-    def __init__(self):
+    POSITION_CODES = {None: 0, 'LONG': 1, 'SHORT': -1}
+    POSITION_NAMES = {0: None, 1: 'LONG', -1: 'SHORT'}
+    EMA_ALPHA = 2.0 / (EMA_SPAN + 1)
+
+    def __init__(self, quarter_gap=QUARTER_GAP, break_confirmation=BREAK_CONFIRMATION,
+                 atr_multiplier=ATR_MULTIPLIER, tp_multiplier=TP_MULTIPLIER):
+        self.quarter_gap = quarter_gap
+        self.break_confirmation = break_confirmation
+        self.atr_multiplier = atr_multiplier
+        self.tp_multiplier = tp_multiplier
+
         self.position = None
         self.entry_price = None
         self.stop_loss = None
         self.take_profit = None
         self.trade_id = 0
-        self.trade_log = []
+        self.trade_log = None
+        self._live = self._new_live_state()
 
     def generate_signals(self, df):
-        df['ema'] = df['Close'].ewm(span=50, adjust=False).mean()
-        df['atr'] = df['High'].rolling(ATR_PERIOD).max() - df['Low'].rolling(ATR_PERIOD).min()
-
-        for i in range(ATR_PERIOD, len(df)):
-            row = df.iloc[i]
-            prev = df.iloc[i - 1]
-
-            base = np.floor(row['Close'] / QUARTER_GAP) * QUARTER_GAP
-            quarter_up = base + QUARTER_GAP
-            quarter_down = base
-
-            price = row['Close']
-            atr = row['atr']
-            ema = row['ema']
-
-            long_condition = (
-                price > quarter_up + BREAK_CONFIRMATION and
-                prev['Close'] > quarter_up + BREAK_CONFIRMATION and
-                price > ema and
-                self.position != 'LONG'
-            )
-
-            short_condition = (
-                price < quarter_down - BREAK_CONFIRMATION and
-                prev['Close'] < quarter_down - BREAK_CONFIRMATION and
-                price < ema and
-                self.position != 'SHORT'
-            )
-
-            if long_condition:
-                if self.position == 'SHORT':
-                    self._exit_trade(row, 'EXIT_SHORT')
-                self._enter_trade(row, 'BUY', atr)
-                self.position = 'LONG'
-
-            elif short_condition:
-                if self.position == 'LONG':
-                    self._exit_trade(row, 'EXIT_LONG')
-                self._enter_trade(row, 'SELL', atr)
-                self.position = 'SHORT'
+        ind = compute_indicators(df)
+        long_break, short_break = break_signals(ind, self.quarter_gap, self.break_confirmation)
+        idx, events, position = _scan_positions(long_break, short_break, self.POSITION_CODES[self.position])
 
-        return self.trade_log
+        # Build every trade column from the event indices
+        atr = ind["atr"][idx]
+        is_exit = events >= EV_EXIT_LONG
+        side = EVENT_SIDE[events]
+        price = ind["fill_close"][idx] + EVENT_SLIPPAGE_SIGN[events] * SLIPPAGE
+        stop = np.where(is_exit, np.nan, price - side * (self.atr_multiplier * atr))
+        target = np.where(is_exit, np.nan, price + side * (self.tp_multiplier * atr))
+
+        # Entries are numbered after any earlier run on this instance; each exit reuses its entry's number
+        trade_no = self.trade_id + np.cumsum(~is_exit)
+        order_ids = np.char.add('US30_', trade_no.astype(str))
+        order_ids[is_exit] = np.char.add(order_ids[is_exit], '_exit')
 
-    def _enter_trade(self, row, action, atr):
-        self.trade_id += 1
-        entry_price = row['Close'] + (SLIPPAGE if action == 'BUY' else -SLIPPAGE)
-        stop = entry_price - ATR_MULTIPLIER * atr if action == 'BUY' else entry_price + ATR_MULTIPLIER * atr
-        target = entry_price + TP_MULTIPLIER * atr if action == 'BUY' else entry_price - TP_MULTIPLIER * atr
-
-        self.entry_price = entry_price
-        self.stop_loss = stop
-        self.take_profit = target
-
-        self.trade_log.append({
-            "Time": row['Time'],
-            "Symbol": "US30",
-            "Action": action,
-            "Price": entry_price,
-            "Quantity": CONTRACT_SIZE,
-            "Order ID": f"US30_{self.trade_id}",
-            "Commission": COMMISSION,
+        n = len(idx)
+        self.trade_log = {
+            "Time": ind["time"][idx],
+            "Symbol": np.full(n, "US30"),
+            "Action": pd.Categorical.from_codes(events, dtype=ACTION_DTYPE),
+            "Price": price,
+            "Quantity": np.full(n, CONTRACT_SIZE),
+            "Order ID": order_ids,
+            "Commission": np.full(n, COMMISSION),
             "StopLoss": stop,
-            "TakeProfit": target
-        })
-
-    def _exit_trade(self, row, action):
-        exit_price = row['Close'] + (SLIPPAGE if action == 'EXIT_SHORT' else -SLIPPAGE)
-
-        self.trade_log.append({
-            "Time": row['Time'],
-            "Symbol": "US30",
-            "Action": action,
-            "Price": exit_price,
-            "Quantity": CONTRACT_SIZE,
-            "Order ID": f"US30_{self.trade_id}_exit",
-            "Commission": COMMISSION
-        })
+            "TakeProfit": target,
+        }
 
-        self.position = None
-        self.entry_price = None
-        self.stop_loss = None
-        self.take_profit = None
+        # Leave the instance describing the open trade, as a bar-by-bar run would
+        self.position = self.POSITION_NAMES[position]
+        if n:
+            self.trade_id = int(trade_no[-1])
+            self.entry_price, self.stop_loss, self.take_profit = price[-1], stop[-1], target[-1]
+        self._sync_live_state(df, ind)
+
+        return self.trade_log
+
+    def update(self, bar):
+        """
+        Live mode: feed one bar (mapping with High/Low/Close) and get the actions it triggers,
+        e.g. ['EXIT_SHORT', 'BUY'], or [] for none. EMA/ATR are carried as scalars, so each
+        bar is O(1). Picks up where a previous generate_signals run ended.
+        """
+        high, low, close = float(bar['High']), float(bar['Low']), float(bar['Close'])
+        live = self._live
+        i, prev_close = live["bars"], live["prev_close"]
+        self._advance(high, low, close)
+        if i < ATR_PERIOD:
+            return []
+
+        base = np.floor(close / self.quarter_gap) * self.quarter_gap
+        up_thr = base + self.quarter_gap + self.break_confirmation
+        dn_thr = base - self.break_confirmation
+        long_break = close > up_thr and prev_close > up_thr and close > live["ema"]
+        short_break = close < dn_thr and prev_close < dn_thr and close < live["ema"]
+
+        _, events, position = _scan_positions(np.array([long_break]), np.array([short_break]),
+                                              self.POSITION_CODES[self.position])
+        self.position = self.POSITION_NAMES[position]
+        for event in events:
+            side = EVENT_SIDE[event]
+            if side:
+                self.trade_id += 1
+                self.entry_price = close + EVENT_SLIPPAGE_SIGN[event] * SLIPPAGE
+                self.stop_loss = self.entry_price - side * self.atr_multiplier * live["atr"]
+                self.take_profit = self.entry_price + side * self.tp_multiplier * live["atr"]
+            else:
+                self.entry_price = self.stop_loss = self.take_profit = None
+        return EVENT_ACTIONS[events].tolist()
+
+    @staticmethod
+    def _new_live_state():
+        return {"bars": 0, "prev_close": None, "ema": None, "atr": np.nan, "tr_sum": 0.0}
+
+    def _advance(self, high, low, close):
+        """Roll the scalar EMA and Wilder ATR forward by one bar (same recurrences as the batch path)."""
+        live = self._live
+        i = live["bars"]
+        if i == 0:
+            live["ema"] = close
+        else:
+            live["ema"] = (1 - self.EMA_ALPHA) * live["ema"] + self.EMA_ALPHA * close
+            prev = live["prev_close"]
+            tr = max(high - low, abs(high - prev), abs(low - prev))
+            if i < ATR_PERIOD:
+                live["tr_sum"] += tr
+            elif i == ATR_PERIOD:
+                live["atr"] = (live["tr_sum"] + tr) / ATR_PERIOD
+            else:
+                live["atr"] = (1 - 1 / ATR_PERIOD) * live["atr"] + tr / ATR_PERIOD
+        live["prev_close"] = close
+        live["bars"] = i + 1
+
+    def _sync_live_state(self, df, ind):
+        n = len(ind["close"])
+        if n > ATR_PERIOD:
+            self._live.update(bars=n, prev_close=float(ind["fill_close"][-1]),
+                              ema=float(ind["ema"][-1]), atr=float(ind["atr"][-1]))
+        else:
+            # ATR is still seeding, so no signal could have fired yet: just replay the bars
+            self._live = self._new_live_state()
+            for high, low, close in zip(df['High'], df['Low'], df['Close']):
+                self._advance(float(high), float(low), float(close))
 
 # === ANALYSIS ===
 def analyze_performance(trades):
-    df = pd.DataFrame(trades)
-    df['PnL'] = 0.0
-    equity_curve = []
-    balance = INITIAL_BALANCE
-    peak = INITIAL_BALANCE
-    max_drawdown = 0.0
-
-    position = None
-    entry_price = None
-
-    for i in range(len(df)):
-        row = df.iloc[i]
-        if row['Action'] in ['BUY', 'SELL']:
-            position = row['Action']
-            entry_price = row['Price']
-        elif row['Action'] in ['EXIT_LONG', 'EXIT_SHORT'] and entry_price is not None:
-            exit_price = row['Price']
-            pnl = (exit_price - entry_price if position == 'BUY' else entry_price - exit_price) * CONTRACT_SIZE - 2 * COMMISSION
-            df.at[i, 'PnL'] = pnl
-            balance += pnl
-            equity_curve.append((row['Time'], balance))
-
-            peak = max(peak, balance)
-            drawdown = (peak - balance) / peak * 100
-            max_drawdown = max(max_drawdown, drawdown)
-
-            position = None
-            entry_price = None
-
-    df['Cumulative PnL'] = df['PnL'].cumsum()
-    pd.DataFrame(equity_curve, columns=["Time", "Equity"]).to_csv(EQUITY_CURVE_PATH, index=False)
+    """`trades` is the column dict returned by QuarterPointStrategy.generate_signals."""
+    actions = pd.Categorical(trades['Action'], dtype=ACTION_DTYPE)
+    prices = trades['Price']
+    is_entry = actions.isin(['BUY', 'SELL'])
+    is_exit = actions.isin(['EXIT_LONG', 'EXIT_SHORT'])
+
+    # Entries and exits alternate, so the k-th exit closes the k-th entry (a final open entry has no exit)
+    n_closed = int(is_exit.sum())
+    entry_prices = prices[is_entry][:n_closed]
+    exit_prices = prices[is_exit]
+    sides = actions[is_entry][:n_closed]
+    pnl = np.where(sides == 'BUY', exit_prices - entry_prices, entry_prices - exit_prices) * CONTRACT_SIZE - 2 * COMMISSION
+    pnl_col = np.zeros(len(actions))
+    pnl_col[is_exit] = pnl
+
+    equity = INITIAL_BALANCE + np.cumsum(pnl)
+    balance = equity[-1] if n_closed else INITIAL_BALANCE
+    peak = np.maximum(np.maximum.accumulate(equity), INITIAL_BALANCE)
+    max_drawdown = ((peak - equity) / peak * 100).max(initial=0.0)
+    equity_curve = pd.DataFrame({"Time": trades['Time'][is_exit], "Equity": equity})
+
+    # Single DataFrame build, only for the CSV output and report
+    df = pd.DataFrame({**trades, 'PnL': pnl_col, 'Cumulative PnL': np.cumsum(pnl_col)})
+    equity_curve.to_csv(EQUITY_CURVE_PATH, index=False)
     df.to_csv(OUTPUT_PATH, index=False)
+    if pa is not None:
+        df.to_parquet(OUTPUT_PARQUET_PATH, compression='snappy', index=False)
 
     # Save performance report
     total_pnl = df['PnL'].sum()
@@ -169,14 +336,18 @@ Max Drawdown: {max_drawdown:.2f}%
     with open(PERFORMANCE_REPORT_PATH, 'w') as f:
         f.write(report)
 
-    # Plot
-    equity_df = pd.DataFrame(equity_curve, columns=["Time", "Equity"])
-    equity_df['Time'] = pd.to_datetime(equity_df['Time'])
-    plt.plot(equity_df['Time'], equity_df['Equity'])
+    # Plot (matplotlib is imported here so importing this module stays cheap)
+    if not PLOT_EQUITY:
+        return
+    import matplotlib
+    matplotlib.use('Agg')  # headless: the equity curve is written to EQUITY_PLOT_PATH, never shown
+    import matplotlib.pyplot as plt
+    plt.plot(equity_curve['Time'], equity_curve['Equity'])
     plt.title("Equity Curve")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    plt.savefig(EQUITY_PLOT_PATH, dpi=100)
+    plt.close()
 
 # === MAIN ===
 if __name__ == '__main__':
@@ -184,14 +355,13 @@ if __name__ == '__main__':
         print("Error: historical_us30.csv not found")
         exit()
 
-    df = pd.read_csv(DATA_PATH)
-    df['Time'] = pd.to_datetime(df['Time'])
+    df = load_price_history(DATA_PATH)
 
     strategy = QuarterPointStrategy()
     trades = strategy.generate_signals(df)
 
-    if trades:
-        print(f"✅ {len(trades)} trades generated. Analyzing...")
+    if len(trades['Action']):
+        print(f"✅ {len(trades['Action'])} trades generated. Analyzing...")
         analyze_performance(trades)
     else:
         print("⚠️ No trades generated during backtest period")
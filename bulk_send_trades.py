@@ -1,6 +1,6 @@
-import requests
-import random
-import time
+import asyncio
+import aiohttp
+import numpy as np
 from datetime import datetime
 
 # === CONFIG ===
@@ -9,33 +9,39 @@ NUM_TRADES = 10  # How many trades to send
 START_PRICE = 34500  # Starting price
 MAX_MOVE = 50  # Maximum price move per trade
 DELAY = 10  # Seconds between sending each trade (adjust as needed)
+MAX_CONNECTIONS = 20  # Pooled keep-alive connections shared by all sends
+
+# === BUILD TRADE SCHEDULE ===
+def build_payloads():
+    rng = np.random.default_rng()
+    moves = rng.uniform(-MAX_MOVE, MAX_MOVE, NUM_TRADES)
+    prices = np.maximum(START_PRICE + np.cumsum(moves), 1).round(2)  # Prevent negative prices
+    actions = rng.choice(["BUY", "SELL"], NUM_TRADES)
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return [
+        {"symbol": "US30", "action": action, "price": price, "order_id": f"BOT_{stamp}_{i}"}
+        for i, (action, price) in enumerate(zip(actions.tolist(), prices.tolist()))
+    ]
 
 # === SEND TRADE FUNCTION ===
-def send_trade(action, price, order_id):
-    payload = {
-        "symbol": "US30",
-        "action": action,
-        "price": price,
-        "order_id": order_id
-    }
-    response = requests.post(WEBHOOK_URL, json=payload)
-    if response.status_code == 200:
-        print(f"✅ Sent {action} at ${price}")
-    else:
-        print(f"❌ Failed to send trade: {response.text}")
+async def send_trade(session, payload, delay):
+    await asyncio.sleep(delay)  # keeps the DELAY spacing; round trips overlap instead of queuing
+    try:
+        async with session.post(WEBHOOK_URL, json=payload) as response:
+            if response.ok:
+                print(f"✅ Sent {payload['action']} at ${payload['price']}")
+            else:
+                print(f"❌ Failed to send trade: {await response.text()}")
+    except aiohttp.ClientError as e:
+        print(f"❌ Failed to send trade: {e}")
 
 # === SIMULATE MULTIPLE TRADES ===
-def simulate_trades():
-    current_price = START_PRICE
-    for i in range(NUM_TRADES):
-        action = random.choice(["BUY", "SELL"])
-        move = random.uniform(-MAX_MOVE, MAX_MOVE)
-        current_price += move
-        current_price = max(current_price, 1)  # Prevent negative prices
-        order_id = f"BOT_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}"
-        send_trade(action, round(current_price, 2), order_id)
-        time.sleep(DELAY)
+async def simulate_trades():
+    payloads = build_payloads()
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(send_trade(session, p, i * DELAY) for i, p in enumerate(payloads)))
 
 # === MAIN ===
 if __name__ == "__main__":
-    simulate_trades()
\ No newline at end of file
+    asyncio.run(simulate_trades())
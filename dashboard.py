@@ -6,7 +6,7 @@ from datetime import datetime
 import numpy as np
 import os
 import requests
-from io import StringIO
+from io import StringIO, BytesIO
 from streamlit_autorefresh import st_autorefresh  # New import
 
 # === Page Config ===
@@ -41,7 +41,9 @@ st.markdown("""
 # === Remote URLs ===
 BASE_URL = "https://trading-bot-1-e2rp.onrender.com"
 TRADES_URL = f"{BASE_URL}/download/trades"
+TRADES_PARQUET_URL = f"{BASE_URL}/download/trades.parquet"
 EQUITY_URL = f"{BASE_URL}/download/equity"
+ACTION_DTYPE = pd.CategoricalDtype(["BUY", "SELL", "EXIT_LONG", "EXIT_SHORT"])
 
 # === Data Loader ===
 @st.cache_data(ttl=300)
@@ -54,6 +56,36 @@ def load_data(url):
         st.error(f"Failed to load data from {url}: {e}")
         return None
 
+@st.cache_data(ttl=300)
+def load_trades():
+    """Prefer the Parquet export (typed columns, no text parse); fall back to the CSV download."""
+    try:
+        response = requests.get(TRADES_PARQUET_URL)
+        response.raise_for_status()
+        return pd.read_parquet(BytesIO(response.content))
+    except Exception:
+        return load_data(TRADES_URL)
+
+@st.cache_data(ttl=300, hash_funcs={pd.DataFrame: lambda d: (len(d), d["Time"].iloc[-1])})
+def summary_metrics(df):
+    """Headline trade metrics. The log is append-only, so (row count, last time) identifies its contents."""
+    pnl = df["PnL"].to_numpy()
+    price = df["Price"].to_numpy()
+    closed = pnl != 0
+    closed_count = closed.sum()
+
+    total_pnl = pnl.sum()
+    win_rate = (pnl > 0).sum() / closed_count * 100 if closed_count else 0
+    avg_pnl = total_pnl / closed_count if closed_count else 0
+    returns = pnl[closed] / price[closed]
+    sharpe_ratio = returns.mean() / returns.std(ddof=1) * np.sqrt(252) if returns.size > 1 else 0
+    return total_pnl, win_rate, avg_pnl, sharpe_ratio
+
+@st.cache_data(ttl=300)
+def sum_pnl_by_day(days, pnl):
+    """Daily PnL totals; `days` is a datetime64[D] array so grouping runs on int64 keys."""
+    return pd.Series(pnl, name="PnL").groupby(days).sum()
+
 # === Sidebar: Filters and Refresh Mode ===
 with st.sidebar:
     st.subheader("🔍 Filters")
@@ -83,36 +115,35 @@ if refresh_mode == "Auto":
 st.title("📈 US30 Trading Bot Dashboard")
 
 # === Load data ===
-df = load_data(TRADES_URL)
+df = load_trades()
 equity_df = load_data(EQUITY_URL)
 
 if df is not None and equity_df is not None:
     # Process data
     df["Time"] = pd.to_datetime(df["Time"])
     df["Price"] = df["Price"].astype(float)
+    df["Action"] = df["Action"].astype(ACTION_DTYPE)  # compares/isin run on integer codes
     equity_df["Time"] = pd.to_datetime(equity_df["Time"])
 
     current_price = df["Price"].iloc[-1]
     
-    df["PnL"] = df.apply(lambda row:
-                         (current_price - row["Price"]) if row["Action"] == "BUY"
-                         else (row["Price"] - current_price), axis=1)
-    df["PnL_Percentage"] = df["PnL"] / df["Price"] * 100
-    df["Status"] = df["PnL"].apply(lambda x: "PROFIT" if x >= 0 else "LOSS")
+    prices = df["Price"].to_numpy()
+    pnl = np.where((df["Action"] == "BUY").to_numpy(), current_price - prices, prices - current_price)
+    df = df.assign(PnL=pnl, PnL_Percentage=pnl / prices * 100, Status=np.where(pnl >= 0, "PROFIT", "LOSS"))
     
-    total_pnl = df["PnL"].sum()
-    win_rate = len(df[df["PnL"] > 0]) / len(df[df["PnL"] != 0]) * 100 if len(df[df["PnL"] != 0]) > 0 else 0
-    avg_pnl = total_pnl / len(df[df["PnL"] != 0]) if len(df[df["PnL"] != 0]) > 0 else 0
-
-    returns = df[df["PnL"] != 0]["PnL"] / df[df["PnL"] != 0]["Price"]
-    sharpe_ratio = (returns.mean() / returns.std()) * np.sqrt(252) if len(returns) > 1 else 0
-    max_drawdown = (equity_df["Equity"].max() - equity_df["Equity"].min()) / equity_df["Equity"].max() * 100
-
-    filtered_df = df[
-        (df["Time"].dt.date >= date_range[0]) &
-        (df["Time"].dt.date <= date_range[1]) &
-        (df["Action"].isin(selected_actions))
-    ]
+    total_pnl, win_rate, avg_pnl, sharpe_ratio = summary_metrics(df)
+    equity = equity_df["Equity"].to_numpy()
+    max_drawdown = (equity.max() - equity.min()) / equity.max() * 100
+
+    # Day buckets as datetime64[D] (int64 underneath); no Python date objects per row
+    trade_days = df["Time"].to_numpy().astype("datetime64[D]")
+    selected = (
+        (trade_days >= np.datetime64(date_range[0])) &
+        (trade_days <= np.datetime64(date_range[1])) &
+        df["Action"].isin(selected_actions).to_numpy()
+    )
+    filtered_df = df[selected]
+    filtered_days = trade_days[selected]
 
     # === Tabs ===
     tab1, tab2, tab3, tab4 = st.tabs(["📈 Overview", "📜 Trade Log", "📊 Advanced Metrics", "🧮 Open Positions"])
@@ -149,9 +180,10 @@ if df is not None and equity_df is not None:
         col1, col2, col3 = st.columns(3)
         col1.metric("Sharpe Ratio", f"{sharpe_ratio:.2f}")
         col2.metric("Max Drawdown", f"{max_drawdown:.2f}%")
-        col3.metric("Profit Factor", 
-                    f"{filtered_df[filtered_df['PnL'] > 0]['PnL'].sum() / abs(filtered_df[filtered_df['PnL'] < 0]['PnL'].sum()):.2f}" 
-                    if filtered_df[filtered_df['PnL'] < 0]['PnL'].sum() != 0 else "∞")
+        filtered_pnl = filtered_df["PnL"].to_numpy()
+        gross_loss = -filtered_pnl[filtered_pnl < 0].sum()
+        gross_profit = filtered_pnl[filtered_pnl > 0].sum()
+        col3.metric("Profit Factor", f"{gross_profit / gross_loss:.2f}" if gross_loss != 0 else "∞")
         
         st.subheader("📉 PnL Distribution")
         fig_hist = px.histogram(filtered_df, x="PnL", color="Status", nbins=20,
@@ -160,16 +192,14 @@ if df is not None and equity_df is not None:
         st.plotly_chart(fig_hist, use_container_width=True)
 
         st.subheader("📅 Daily Performance")
-        daily_pnl = filtered_df.groupby(filtered_df["Time"].dt.date)["PnL"].sum()
+        daily_pnl = sum_pnl_by_day(filtered_days, filtered_df["PnL"].to_numpy())
         fig_bar = px.bar(daily_pnl, y="PnL", labels={'PnL': 'PnL ($)'}, title="Daily PnL")
         st.plotly_chart(fig_bar, use_container_width=True)
 
     with tab4:
         st.subheader("🧮 Open Positions Overview")
         open_trades = df.copy()
-        open_trades["Real-Time PnL"] = open_trades.apply(
-            lambda row: (current_price - row["Price"]) if row["Action"] == "BUY" 
-                        else (row["Price"] - current_price), axis=1)
+        open_trades["Real-Time PnL"] = open_trades["PnL"]  # same mark-to-last-price PnL as above
 
         st.dataframe(
             open_trades[["Time", "Symbol", "Action", "Price", "Real-Time PnL"]].sort_values("Time", ascending=False),
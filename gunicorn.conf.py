@@ -0,0 +1,19 @@
+# gunicorn.conf.py — picked up automatically by `gunicorn main:app`
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# Webhook handlers mostly wait on network I/O. Default is threaded workers;
+# GUNICORN_WORKER_CLASS=gevent switches to cooperative greenlets (gunicorn
+# monkey-patches sockets/threads before main.py is imported, so the pooled
+# requests sessions and background workers become non-blocking as well).
+# Keep a single process by default — idempotency (LAST_SEEN), the buffered
+# trade/equity logs and the NAV cache are per-process state.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))        # gthread only
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))  # gevent only
+timeout = 30
+# on restart/deploy a worker first finishes the broker jobs it already acked with 202;
+# this is the upper bound on that drain before gunicorn kills it
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
@@ -1,19 +1,61 @@
 # main.py
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
-from datetime import datetime, timezone, date
-import os, csv, math, uuid, requests, json, pytz
+from datetime import datetime, timezone, date, timedelta
+import os, io, csv, uuid, requests, json, threading, atexit, queue, struct, gzip, hashlib
+from zoneinfo import ZoneInfo
+import numpy as np
+from functools import lru_cache
+from collections import OrderedDict, Counter
 import oandapyV20
 import oandapyV20.endpoints.orders as orders
 import oandapyV20.endpoints.accounts as accounts
+from oandapyV20.exceptions import V20Error
 from dotenv import load_dotenv
 from requests.auth import HTTPBasicAuth
-from time import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from time import time, sleep, monotonic
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+try:
+    import orjson  # optional fast JSON; falls back to stdlib json
+except ImportError:
+    orjson = None
 
 # === Initialize ===
 app = Flask(__name__)
 CORS(app)
 load_dotenv()
+# behind nginx/apache, let the proxy stream plain file downloads (X-Sendfile)
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "false").lower() == "true"
+
+# ========== JSON ==========
+if orjson is not None:
+    from flask.json.provider import JSONProvider
+
+    _ORJSON_OPTS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+    class OrjsonProvider(JSONProvider):
+        """Flask JSON provider backed by orjson (same sorted-key output as the default)."""
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=_ORJSON_OPTS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(orjson.dumps(obj, option=_ORJSON_OPTS | orjson.OPT_APPEND_NEWLINE), mimetype="application/json")
+
+    app.json = OrjsonProvider(app)
+
+def json_bytes(obj) -> bytes:
+    """Encode an outgoing request/file payload as UTF-8 JSON bytes."""
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
+
+def json_load(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 # ========== Execution Mode & Global Guards ==========
 LOCAL_TEST        = os.getenv("LOCAL_TEST", "true").lower() == "true"           # dry-switch inside server (also overridable per route)
@@ -39,6 +81,7 @@ DUP_USER   = os.getenv("DUPLIKIUM_USER") or ""
 DUP_TOKEN  = os.getenv("DUPLIKIUM_TOKEN") or ""
 DUP_AUTH   = os.getenv("DUPLIKIUM_AUTH_STYLE", "headers").lower()  # headers | bearer | basic | token
 DUP_PATH   = os.getenv("DUPLIKIUM_ORDERS_PATH", "/orders")
+DUP_URL    = f"{DUP_BASE}{DUP_PATH}"
 MASTER_SRC = os.getenv("MASTER_SOURCE", "OANDA_MASTER")
 FORWARD_TO_DUP = os.getenv("FORWARD_TO_DUPLIKIUM", "true").lower() == "true"
 
@@ -52,13 +95,55 @@ def dup_headers():
 def dup_auth():
     return HTTPBasicAuth(DUP_USER, DUP_TOKEN) if DUP_AUTH == "basic" else None
 
+# ========== Shared HTTP Sessions ==========
+# One pooled keep-alive session per upstream so each call reuses the TLS connection.
+def _pooled(session: requests.Session, pool_connections=4, pool_maxsize=8, retries=None) -> requests.Session:
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=retries or Retry(total=1, backoff_factor=0.1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# (connect, read): an unreachable broker fails in seconds; a slow but live one still gets the
+# full read budget. Bounds the OANDA leg the same way Duplikium (12s) is bounded while both run.
+CONNECT_TIMEOUT_SECS = float(os.getenv("CONNECT_TIMEOUT_SECS", "3"))
+_oanda_client = oandapyV20.API(access_token=OANDA_TOKEN, environment="practice",
+                               request_params={"timeout": (CONNECT_TIMEOUT_SECS, 10)}) if OANDA_TOKEN else None
+if _oanda_client is not None:
+    # orders from every request thread plus the NAV refresher share this pool
+    _pooled(_oanda_client.client, pool_connections=10, pool_maxsize=20)
+
+# NAV reads go through the same pool with a much shorter timeout: a stalled read only
+# delays the next refresh, and the last good NAV keeps being served meanwhile.
+NAV_TIMEOUT_SECS = float(os.getenv("NAV_TIMEOUT_SECS", "2"))
+_oanda_nav_client = oandapyV20.API(access_token=OANDA_TOKEN, environment="practice",
+                                   request_params={"timeout": (min(CONNECT_TIMEOUT_SECS, NAV_TIMEOUT_SECS), NAV_TIMEOUT_SECS)}) if OANDA_TOKEN else None
+if _oanda_nav_client is not None:
+    _oanda_nav_client.client = _oanda_client.client
+
+# Gateway errors are retried, but only for methods urllib3 considers idempotent: a
+# Duplikium order POST is never replayed once the request has been sent. Connect
+# failures (nothing sent yet) are retried for every method.
+DUP_READ_TIMEOUT_SECS = 12
+_DUP_RETRY = Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504], raise_on_status=False)
+_dup_session = _pooled(requests.Session(), pool_connections=8, pool_maxsize=16, retries=_DUP_RETRY)
+_dup_session.headers.update(dup_headers())
+_dup_session.auth = dup_auth()
+
+# A repeated Discord embed is harmless, so its POSTs are retried on gateway errors too.
+_discord_session = _pooled(requests.Session(), pool_connections=8, pool_maxsize=16,
+                           retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504],
+                                         allowed_methods=frozenset({"POST"}), raise_on_status=False))
+_discord_session.headers["Content-Type"] = "application/json"
+
 # ========== Risk Config ==========
 MAX_RISK_PCT          = float(os.getenv("MAX_RISK_PCT", "0.50"))     # hard cap, e.g. 0.50% per trade
 MAX_UNITS             = int(os.getenv("MAX_UNITS", "300000"))        # absolute ceiling
 MASTER_START_BAL      = float(os.getenv("MASTER_START_BAL", "1000000"))
 
 # Allowlist (uppercased TV symbols)
-SYMBOL_ALLOW = [s.strip().upper() for s in os.getenv("SYMBOL_ALLOWLIST", "US30,NAS100,XAUUSD,EURUSD").split(",") if s.strip()]
+SYMBOL_ALLOWLIST = [s.strip().upper() for s in os.getenv("SYMBOL_ALLOWLIST", "US30,NAS100,XAUUSD,EURUSD").split(",") if s.strip()]
+SYMBOL_ALLOW = frozenset(SYMBOL_ALLOWLIST)  # membership checks on the request path
 
 # Per-symbol unit caps, JSON or comma form:
 # Example JSON: {"EURUSD": 100000, "XAUUSD": 5000, "US30": 5}
@@ -96,160 +181,454 @@ SYMBOL_META = {
     "NAS100_USD":{"aliases": ["NAS100","US100","NAS100USD","OANDA:NAS100USD"],    "kind": "index", "point": 1.0},
 }
 
+_STRIP = str.maketrans("", "", ":.")  # symbol normalization: drop exchange prefix/suffix separators
 ALIAS_TO_OANDA = {}
 for o_sym, meta in SYMBOL_META.items():
     ALIAS_TO_OANDA[o_sym] = o_sym
     for a in meta.get("aliases", []):
-        ALIAS_TO_OANDA[a.upper().replace(":", "").replace(".", "")] = o_sym
+        # normalized form plus the raw spellings, so common inputs hit without any string work
+        for key in (a.upper().translate(_STRIP), a, a.upper(), a.lower()):
+            ALIAS_TO_OANDA[key] = o_sym
 
+@lru_cache(maxsize=1024)
 def map_symbol(tv_symbol: str) -> str:
-    raw = (tv_symbol or "").upper().replace(":", "").replace(".", "")
+    hit = ALIAS_TO_OANDA.get(tv_symbol)
+    if hit:
+        return hit
+    raw = (tv_symbol or "").upper().translate(_STRIP)
     return ALIAS_TO_OANDA.get(raw, raw)
 
+# price delta per 1 unit of qty, per instrument and unit type ("price", "pips", "points")
+_DEFAULT_DELTA = {"price": 1.0, "pips": 0.0001, "points": 0.0001}
+_DELTA_TABLE = {
+    o_sym: {
+        "price": 1.0,
+        "pips": meta.get("pip", 0.0001),
+        "points": meta.get("point", 1.0) if meta.get("kind") in ("index", "metal") else meta.get("pip", 0.0001),
+    }
+    for o_sym, meta in SYMBOL_META.items()
+}
+
 def to_price_delta(oanda_sym: str, qty: float, unit_type: str) -> float:
     """
     Convert a qty in 'pips' or 'points' to a price delta for the instrument.
-    If unit_type == 'price', returns qty as-is.
+    If unit_type == 'price', returns qty as-is. Unknown unit types are treated as points.
     """
-    unit_type = (unit_type or "").lower()
     if qty is None:
         return 0.0
-    if unit_type == "price":
-        return float(qty)
-
-    meta = SYMBOL_META.get(oanda_sym, {})
-    kind = meta.get("kind")
-
-    if unit_type == "pips":  # FX
-        pip = meta.get("pip", 0.0001)
-        return float(qty) * pip
-
-    # default treat as "points"
-    if kind in ("index", "metal"):
-        point = meta.get("point", 1.0)
-        return float(qty) * point
-
-    # fallback for fx if "points" sent
-    pip = meta.get("pip", 0.0001)
-    return float(qty) * pip
+    mult = _DELTA_TABLE.get(oanda_sym, _DEFAULT_DELTA)
+    return float(qty) * mult.get((unit_type or "").lower(), mult["points"])
 
 # ========== Live OANDA Balance Cache ==========
-_balance_cache = {"val": None, "ts": 0}
-
-def get_oanda_balance():
-    """Fetch live OANDA NAV (cached ~15s). Falls back to MASTER_START_BAL if any read fails."""
-    now = time()
-    if _balance_cache["val"] is not None and now - _balance_cache["ts"] < 15:
-        return _balance_cache["val"]
+BALANCE_REFRESH_SECS = float(os.getenv("BALANCE_REFRESH_SECS", "10"))
+NAV_MAX_AGE_SECS = float(os.getenv("NAV_MAX_AGE_SECS", "60"))  # older than this and the cached NAV is not used
+_balance = (None, 0.0)  # (NAV, monotonic fetch time), swapped as one tuple so readers never see a torn pair
+
+def _fetch_nav_uncached():
+    if not _oanda_nav_client or not OANDA_ACCOUNT_ID:
+        raise RuntimeError("Missing OANDA credentials")
+    req = accounts.AccountSummary(accountID=OANDA_ACCOUNT_ID)
+    resp = _oanda_nav_client.request(req)
+    acct = resp.get("account", {})
+    bal = float(acct.get("NAV", acct.get("balance")))
+    if not bal or bal <= 0:
+        raise RuntimeError("Invalid balance from OANDA")
+    return bal
+
+def _refresh_nav():
+    global _balance
     try:
-        if not OANDA_TOKEN or not OANDA_ACCOUNT_ID:
-            raise RuntimeError("Missing OANDA credentials")
-        client = oandapyV20.API(access_token=OANDA_TOKEN, environment="practice")
-        req = accounts.AccountSummary(accountID=OANDA_ACCOUNT_ID)
-        resp = client.request(req)
-        acct = resp.get("account", {})
-        bal = float(acct.get("NAV", acct.get("balance")))
-        if not bal or bal <= 0:
-            raise RuntimeError("Invalid balance from OANDA")
-        _balance_cache["val"] = bal
-        _balance_cache["ts"]  = now
-        return bal
+        _balance = (_fetch_nav_uncached(), monotonic())
     except Exception:
-        return MASTER_START_BAL
+        pass  # keep the last good value
+
+def _nav_refresher():
+    """Keep _balance warm so request handlers never wait on OANDA."""
+    while True:
+        sleep(BALANCE_REFRESH_SECS)
+        _refresh_nav()
+
+if _oanda_client and OANDA_ACCOUNT_ID:
+    # first read is synchronous (bounded by NAV_TIMEOUT_SECS) so the first webhooks after
+    # boot are sized off the real NAV rather than MASTER_START_BAL
+    _refresh_nav()
+    threading.Thread(target=_nav_refresher, name="nav-refresher", daemon=True).start()
+
+def nav_age_secs():
+    """Seconds since the last successful NAV read (None if there hasn't been one)."""
+    return None if _balance[0] is None else monotonic() - _balance[1]
+
+def live_nav():
+    """Latest OANDA NAV from the refresher; None if there is none or it is older than NAV_MAX_AGE_SECS."""
+    nav, fetched = _balance
+    if nav is None or monotonic() - fetched > NAV_MAX_AGE_SECS:
+        return None
+    return nav
+
+def get_oanda_balance():
+    """live_nav() for sizing, falling back to MASTER_START_BAL when no fresh NAV is available."""
+    nav = live_nav()
+    return MASTER_START_BAL if nav is None else nav
 
 # ========== Local Sim/Logs ==========
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 starting_equity = 10000
 trade_log_file = os.path.join(BASE_DIR, "simulated_trades.csv")
-equity_file = os.path.join(BASE_DIR, "equity_curve.csv")
+equity_file = os.path.join(BASE_DIR, "equity_curve.csv")         # legacy text log, migrated once
+equity_bin_file = os.path.join(BASE_DIR, "equity_curve.bin")
 daily_nav_file = os.path.join(BASE_DIR, "daily_nav.json")
-current_equity = starting_equity
+reject_log_file = os.path.join(BASE_DIR, "rejections.log")
 
 if not os.path.exists(trade_log_file):
     with open(trade_log_file, "w", newline="") as f:
         csv.writer(f).writerow(["Symbol", "Action", "Price", "Order ID", "Time"])
 
-if not os.path.exists(equity_file):
-    with open(equity_file, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["Time", "Equity"])
-        w.writerow([datetime.now().isoformat(), starting_equity])
+if not os.path.exists(reject_log_file):
+    with open(reject_log_file, "w", newline="") as f:
+        csv.writer(f).writerow(["Time", "Reason", "Symbol", "Action", "Price", "Order ID"])
+
+# Equity log: fixed 16-byte records (local wall-clock µs since 1970-01-01, equity).
+# Exported as CSV on demand by /download/equity.
+_EQ_REC = struct.Struct("<qd")
+_EPOCH = datetime(1970, 1, 1)
+
+def _pack_equity(ts: datetime, equity) -> bytes:
+    return _EQ_REC.pack((ts - _EPOCH) // timedelta(microseconds=1), float(equity))
+
+_EQ_DTYPE = np.dtype([("us", "<i8"), ("equity", "<f8")])  # same layout as _EQ_REC
+_equity_np = (None, None, None)  # (file key, timestamps, equity), swapped as one tuple
 
-def save_trade_to_csv(symbol, action, price, order_id):
-    with open(trade_log_file, "a", newline="") as f:
-        csv.writer(f).writerow([symbol, action.upper(), price, order_id, datetime.now().isoformat()])
+def _load_equity_np():
+    """
+    (file key, datetime64[us] timestamps, float64 equity) for the whole log; flushes pending
+    rows first and re-reads only when the file changes.
+    """
+    global _equity_np
+    flush_logs()
+    key = _log_key("equity")
+    hit = _equity_np
+    if hit[0] != key:
+        recs = np.fromfile(equity_bin_file, dtype=_EQ_DTYPE, count=key[1] // _EQ_DTYPE.itemsize)
+        hit = _equity_np = (key, recs["us"].astype("datetime64[us]"), recs["equity"])
+    return hit
+
+def equity_stats():
+    _, ts, eq = _load_equity_np()
+    if not len(eq):
+        return {"points": 0}
+    peak = np.maximum.accumulate(eq)
+    dd_pct = (peak - eq) / peak * 100.0
+    pnl = np.diff(eq)
+    return {
+        "points": int(len(eq)),
+        "start": str(ts[0]), "end": str(ts[-1]),
+        "start_equity": float(eq[0]), "equity": float(eq[-1]),
+        "total_pnl": float(eq[-1] - eq[0]),
+        "max_drawdown_pct": round(float(dd_pct.max()), 4),
+        "winning_steps": int((pnl > 0).sum()), "losing_steps": int((pnl < 0).sum()),
+    }
 
-def save_equity_to_csv(equity):
-    with open(equity_file, "a", newline="") as f:
-        csv.writer(f).writerow([datetime.now().isoformat(), equity])
+if not os.path.exists(equity_bin_file):
+    rows = []
+    if os.path.exists(equity_file):
+        with open(equity_file, "r", newline="") as f:
+            for rec in list(csv.reader(f))[1:]:
+                try:
+                    rows.append(_pack_equity(datetime.fromisoformat(rec[0]), rec[1]))
+                except (ValueError, IndexError):
+                    pass
+    if not rows:
+        rows.append(_pack_equity(datetime.now(), starting_equity))
+    with open(equity_bin_file, "wb") as f:
+        f.write(b"".join(rows))
+
+def _read_last_equity(path):
+    """Equity of the last complete record in an equity log (None if it has none)."""
+    try:
+        with open(path, "rb") as f:
+            n = os.fstat(f.fileno()).st_size // _EQ_REC.size
+            if not n:
+                return None
+            f.seek((n - 1) * _EQ_REC.size)
+            return _EQ_REC.unpack(f.read(_EQ_REC.size))[1]
+    except OSError:
+        return None
+
+def _read_last_trade(path):
+    """Last logged trade row from the tail of the CSV (None if only the header exists)."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            window = 4096
+            while True:
+                f.seek(max(0, size - window))
+                tail = f.read()
+                # the last row is complete once a line break precedes it (or we hit the file start)
+                if window >= size or b"\n" in tail.rstrip(b"\r\n"):
+                    break
+                window *= 4
+            lines = [ln for ln in tail.decode("utf-8", "replace").splitlines() if ln.strip()]
+    except OSError:
+        return None
+    if not lines:
+        return None
+    row = next(csv.reader([lines[-1]]))
+    return None if row[:2] == ["Symbol", "Action"] else row
+
+# Resume the simulated curve where the previous run left it; if a log was just rotated,
+# its last record is in the .1 copy.
+_last_trade = _read_last_trade(trade_log_file) or _read_last_trade(trade_log_file + ".1")
+current_equity = next((eq for eq in map(_read_last_equity, (equity_bin_file, equity_bin_file + ".1"))
+                       if eq is not None), starting_equity)
+
+# Append-only log fds: encoded rows queue up per file and a background thread hands
+# each queue to a single os.writev() (+ fsync) every LOG_FLUSH_INTERVAL seconds, as
+# soon as a file has LOG_FLUSH_ROWS rows pending, and on exit. O_APPEND keeps each
+# batch contiguous even with several writer processes. A file that grows past
+# LOG_ROTATE_MB is renamed to <name>.1 (older copies shift up to LOG_ROTATE_KEEP)
+# and reopened empty, with its header, so appends and tail reads stay cheap.
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.05"))
+LOG_FLUSH_ROWS = 32
+LOG_FSYNC = os.getenv("LOG_FSYNC", "true").lower() == "true"  # group commit: one fsync per file per flush
+LOG_ROTATE_BYTES = int(float(os.getenv("LOG_ROTATE_MB", "64")) * (1 << 20))  # 0 disables rotation
+LOG_ROTATE_KEEP = max(1, int(os.getenv("LOG_ROTATE_KEEP", "5")))
+_IOV_MAX = 512  # stay well under the platform's writev() iovec limit
+_log_lock = threading.Lock()    # guards the pending row lists only; request threads take it to append
+_flush_lock = threading.Lock()  # serializes writev/fsync/rotation and fd swaps; never held by _append
+_flush_now = threading.Event()
+_APPEND_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+
+def _csv_line(fields) -> bytes:
+    """One CSV row as csv.writer would write it (minimal quoting, CRLF)."""
+    out = []
+    for v in fields:
+        v = "" if v is None else str(v)
+        if "," in v or '"' in v or "\n" in v or "\r" in v:
+            v = '"' + v.replace('"', '""') + '"'
+        out.append(v)
+    return (",".join(out) + "\r\n").encode()
+
+def _open_log(path, header=b""):
+    return {"path": path, "header": header, "fd": os.open(path, _APPEND_FLAGS, 0o644), "rows": []}
+
+_logs = {
+    "trades":  _open_log(trade_log_file, _csv_line(["Symbol", "Action", "Price", "Order ID", "Time"])),
+    "equity":  _open_log(equity_bin_file),
+    "rejects": _open_log(reject_log_file, _csv_line(["Time", "Reason", "Symbol", "Action", "Price", "Order ID"])),
+}
 
-def simulate_equity(price, action):
+# The logs are created above and held open for the life of the process, so routes
+# don't re-check their existence; cache keys come from fstat on the open fds.
+def _log_key(name):
+    with _flush_lock:  # the fd may be swapped by a rotation
+        st = os.fstat(_logs[name]["fd"])
+    return (st.st_mtime_ns, st.st_size)
+
+def _rotate(log):
+    """Shift <path>.N backups up by one, move the live file to <path>.1, reopen it empty."""
+    os.close(log["fd"])
+    path = log["path"]
+    for i in range(LOG_ROTATE_KEEP - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+    log["fd"] = os.open(path, _APPEND_FLAGS, 0o644)
+    if log["header"]:
+        os.write(log["fd"], log["header"])
+
+def _append(name, data: bytes):
+    with _log_lock:
+        log = _logs.get(name)
+        if log is not None:
+            log["rows"].append(data)
+            if len(log["rows"]) >= LOG_FLUSH_ROWS:
+                _flush_now.set()
+
+def _write_rows(fd, rows):
+    for i in range(0, len(rows), _IOV_MAX):
+        chunk = rows[i:i + _IOV_MAX]
+        if hasattr(os, "writev"):
+            n = os.writev(fd, chunk)
+            rest = b"" if n == sum(map(len, chunk)) else b"".join(chunk)[n:]
+        else:  # Windows
+            rest = b"".join(chunk)
+        while rest:
+            rest = rest[os.write(fd, rest):]
+
+def flush_logs():
+    """Push buffered trade/equity rows to disk (call before reading the files)."""
+    with _flush_lock:
+        # swap the pending lists out so appends never wait on writev/fsync
+        with _log_lock:
+            batches = []
+            for log in _logs.values():
+                if log["rows"]:
+                    batches.append((log, log["rows"]))
+                    log["rows"] = []
+        for log, rows in batches:
+            _write_rows(log["fd"], rows)
+            if LOG_FSYNC:
+                os.fsync(log["fd"])
+            if LOG_ROTATE_BYTES and os.fstat(log["fd"]).st_size >= LOG_ROTATE_BYTES:
+                _rotate(log)
+
+def _close_logs():
+    flush_logs()
+    with _flush_lock, _log_lock:
+        for log in _logs.values():
+            os.close(log["fd"])
+        _logs.clear()
+
+def _log_flusher():
+    while True:
+        _flush_now.wait(LOG_FLUSH_INTERVAL)
+        _flush_now.clear()
+        flush_logs()
+
+threading.Thread(target=_log_flusher, name="log-flusher", daemon=True).start()
+atexit.register(_close_logs)
+
+def save_trade_to_csv(symbol, action, price, order_id, ts=None):
+    """ts: naive local datetime of the signal (defaults to now)."""
+    global _last_trade
+    row = [symbol, action.upper(), price, order_id, (ts or datetime.now()).isoformat()]
+    _append("trades", _csv_line(row))
+    _last_trade = row
+
+def save_equity(equity, ts=None):
+    _append("equity", _pack_equity(ts or datetime.now(), equity))
+
+# Signals blocked by a guard are logged to rejections.log and counted; Discord gets
+# one summary per REJECT_SUMMARY_SECS instead of a post per rejected signal.
+REJECT_SUMMARY_SECS = float(os.getenv("REJECT_SUMMARY_SECS", "60"))
+_reject_counter = Counter()
+_reject_lock = threading.Lock()
+
+def record_rejection(reason, symbol, action, price, order_id, ts=None):
+    _append("rejects", _csv_line([(ts or datetime.now()).isoformat(), reason, symbol, action.upper(), price, order_id]))
+    with _reject_lock:
+        _reject_counter[reason] += 1
+
+def simulate_equity(price, action, ts=None):
     global current_equity
-    last_trade = None
-    if os.path.exists(trade_log_file):
-        with open(trade_log_file, "r") as f:
-            rows = list(csv.reader(f))
-            if len(rows) > 1:
-                last_trade = rows[-1]
+    last_trade = _last_trade
     if last_trade and last_trade[1] in ["BUY", "SELL"]:
         entry_price = float(last_trade[2])
         direction = 1 if last_trade[1] == "BUY" else -1
         pnl = (float(price) - entry_price) * direction
         current_equity += pnl
-        save_equity_to_csv(current_equity)
+        save_equity(current_equity, ts)
+
+def rebuild_equity_curve():
+    """
+    Replay the live trade log into a fresh equity log in one vectorized pass, with the same
+    rule as simulate_equity: each trade marks the previous trade's direction to its own
+    price. Only simulated_trades.csv is replayed (not rotated .N copies); the equity log
+    being replaced is kept as equity_curve.bin.bak. Returns the number of points.
+    """
+    global current_equity
+    flush_logs()
+    # both log locks are held for the whole replay: no trade row or equity point can land
+    # between reading the trade log and swapping in the rebuilt equity log
+    with _flush_lock, _log_lock:
+        trades = _logs["trades"]
+        if trades["rows"]:  # appended since the flush above
+            _write_rows(trades["fd"], trades["rows"])
+            trades["rows"] = []
+        with open(trade_log_file, newline="") as f:
+            rows = [r for r in csv.reader(f) if len(r) >= 5 and r[1] in ("BUY", "SELL")]
+        px = np.array([r[2] for r in rows], dtype="f8")
+        direction = np.where(np.array([r[1] for r in rows]) == "BUY", 1, -1).astype("i1")
+        # first point is the starting equity (the live log opens with it too), at the first trade's time
+        recs = np.empty(len(rows), dtype=_EQ_DTYPE)
+        recs["us"] = np.array([r[4] for r in rows], dtype="datetime64[us]").astype("<i8")
+        recs["equity"] = starting_equity + np.concatenate(([0.0], np.cumsum(np.diff(px) * direction[:-1])))
+
+        tmp = equity_bin_file + ".tmp"
+        recs.tofile(tmp)
+        log = _logs["equity"]
+        log["rows"] = []  # superseded by the replay
+        os.replace(equity_bin_file, equity_bin_file + ".bak")
+        os.replace(tmp, equity_bin_file)
+        os.close(log["fd"])
+        log["fd"] = os.open(equity_bin_file, _APPEND_FLAGS, 0o644)
+        current_equity = float(recs["equity"][-1]) if len(recs) else starting_equity
+    return len(recs)
 
 # ========== Trading Window & Daily-Loss Guard ==========
-def trading_window_ok(now_utc: datetime) -> bool:
-    """If TRADING_WINDOW set (e.g. '09:30-16:00'), enforce local time window in TRADING_TZ."""
-    if not TRADING_WINDOW:
-        return True
+_TZ = ZoneInfo(TRADING_TZ)
+
+def _parse_window(raw: str):
+    """'09:30-16:00' -> (start_secs, end_secs) since local midnight; None if unset or unparsable."""
     try:
-        tz = pytz.timezone(TRADING_TZ)
-        local_now = now_utc.astimezone(tz)
-        start_s, end_s = TRADING_WINDOW.split("-", 1)
+        start_s, end_s = raw.split("-", 1)
         start_h, start_m = [int(x) for x in start_s.split(":")]
         end_h, end_m     = [int(x) for x in end_s.split(":")]
-        start_dt = local_now.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
-        end_dt   = local_now.replace(hour=end_h,   minute=end_m,   second=0, microsecond=0)
-        return start_dt <= local_now <= end_dt
+        return start_h * 3600 + start_m * 60, end_h * 3600 + end_m * 60
     except Exception:
-        return True  # fail open if window parsing fails
+        return None  # fail open if window parsing fails
+
+_WINDOW = _parse_window(TRADING_WINDOW) if TRADING_WINDOW else None
+
+def trading_window_ok(now_utc: datetime) -> bool:
+    """If TRADING_WINDOW set (e.g. '09:30-16:00'), enforce local time window in TRADING_TZ."""
+    if _WINDOW is None:
+        return True
+    t = now_utc.astimezone(_TZ)
+    secs = t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6
+    return _WINDOW[0] <= secs <= _WINDOW[1]
 
 def _read_daily_nav():
     try:
-        with open(daily_nav_file, "r") as f:
-            return json.load(f)
+        with open(daily_nav_file, "rb") as f:
+            return json_load(f.read())
     except Exception:
         return {}
 
 def _write_daily_nav(obj):
     try:
-        with open(daily_nav_file, "w") as f:
-            json.dump(obj, f)
+        with open(daily_nav_file, "wb") as f:
+            f.write(json_bytes(obj))
     except Exception:
         pass
 
+# start-of-day record lives in memory; the JSON file is only rewritten when the day rolls.
+# The dict is never mutated: a new day rebinds _daily_nav to a fresh dict, so readers can
+# use it without the lock, which only serializes that rollover.
+_daily_nav = _read_daily_nav()
+_daily_nav_lock = threading.Lock()
+
 def daily_loss_guard(now_utc: datetime) -> (bool, dict):
     """
     Freeze trading if current NAV has dropped below (1 - DAILY_LOSS_STOP_PCT%) of start-of-day NAV.
     Returns (ok, info_dict).
     """
+    global _daily_nav
     if DAILY_LOSS_STOP_PCT <= 0:
         return True, {"enabled": False}
-    tz = pytz.timezone(TRADING_TZ)
-    local_today = now_utc.astimezone(tz).date().isoformat()
+    local_today = now_utc.astimezone(_TZ).date().isoformat()
 
-    data = _read_daily_nav()
+    data = _daily_nav
     sod = data.get("start_nav", None)
     sod_date = data.get("date", None)
 
-    nav_now = get_oanda_balance()
+    nav_now = live_nav()
+    if nav_now is None:
+        # no fresh NAV to compare (or to start the day from): never record the fallback as
+        # start-of-day, and don't block on a drawdown we can't measure
+        return True, {"enabled": True, "start_nav": sod if sod_date == local_today else None,
+                      "nav_now": None, "drawdown_pct": None, "limit_pct": DAILY_LOSS_STOP_PCT}
 
-    # reset SOD on new local date or missing record
+    # reset SOD on new local date or missing record; re-checked under the lock so only one
+    # request starts the day (and queues one file write)
     if (sod is None) or (sod_date != local_today):
-        data = {"date": local_today, "start_nav": nav_now}
-        _write_daily_nav(data)
-        return True, {"enabled": True, "start_nav": nav_now, "nav_now": nav_now, "drawdown_pct": 0.0, "limit_pct": DAILY_LOSS_STOP_PCT}
+        with _daily_nav_lock:
+            data = _daily_nav
+            if data.get("start_nav") is None or data.get("date") != local_today:
+                data = {"date": local_today, "start_nav": nav_now}
+                _daily_nav = data
+                _outbound_pool.submit(_write_daily_nav, data)
+                return True, {"enabled": True, "start_nav": nav_now, "nav_now": nav_now, "drawdown_pct": 0.0, "limit_pct": DAILY_LOSS_STOP_PCT}
 
     # check drawdown
     start_nav = float(data["start_nav"])
@@ -260,14 +639,8 @@ def daily_loss_guard(now_utc: datetime) -> (bool, dict):
     return ok, {"enabled": True, "start_nav": start_nav, "nav_now": nav_now, "drawdown_pct": round(dd_pct, 4), "limit_pct": DAILY_LOSS_STOP_PCT}
 
 # ========== Sizing ==========
-def clamp_units(units: int) -> int:
-    return max(1, min(int(units), MAX_UNITS))
-
-def apply_symbol_cap(units: int, tv_symbol: str) -> int:
-    cap = SYMBOL_RISK_CAPS.get(tv_symbol.upper())
-    if cap is None:
-        return units
-    return max(1, min(int(units), int(cap)))
+# effective unit ceiling per symbol: MAX_UNITS, tightened by SYMBOL_RISK_CAPS
+_UNIT_CEILING = {sym: min(MAX_UNITS, cap) for sym, cap in SYMBOL_RISK_CAPS.items()}
 
 def size_for_risk(tv_symbol, balance, risk_pct, entry, sl_price):
     """
@@ -277,29 +650,58 @@ def size_for_risk(tv_symbol, balance, risk_pct, entry, sl_price):
     - clamps units to MAX_UNITS
     - clamps units to SYMBOL_RISK_CAPS[tv_symbol] if provided
     """
-    requested = float(risk_pct or 0.0)
-    risk_used = min(requested, MAX_RISK_PCT)
-    if not sl_price or sl_price == entry:
-        base = clamp_units(1)
-        return apply_symbol_cap(base, tv_symbol)
-
-    price_delta = abs(entry - sl_price)
+    price_delta = abs(entry - sl_price) if sl_price else 0.0
     if price_delta <= 0:
-        base = clamp_units(1)
-        return apply_symbol_cap(base, tv_symbol)
+        return 1  # no usable SL: minimum size (already within every clamp/cap)
+
+    risk_dollars = balance * (min(float(risk_pct or 0.0), MAX_RISK_PCT) / 100.0)
+    return max(1, min(int(risk_dollars / price_delta), _UNIT_CEILING.get(tv_symbol, MAX_UNITS)))
 
-    risk_dollars = float(balance) * (risk_used / 100.0)
-    units = math.floor(risk_dollars / price_delta)
-    units = clamp_units(units)
-    units = apply_symbol_cap(units, tv_symbol)
-    return units
+# ========== Circuit Breakers ==========
+BREAKER_FAILS      = int(os.getenv("BREAKER_FAILS", "5"))          # consecutive upstream failures to open
+BREAKER_RESET_SECS = float(os.getenv("BREAKER_RESET_SECS", "30"))  # how long an open breaker refuses calls
+
+class _Breaker:
+    """
+    Per-broker circuit breaker: after BREAKER_FAILS consecutive upstream failures (network
+    errors, 5xx) calls are refused for BREAKER_RESET_SECS, then a single trial call is let
+    through; its success closes the breaker, its failure re-opens it.
+    """
+    def __init__(self, threshold=BREAKER_FAILS, reset_after=BREAKER_RESET_SECS):
+        self.threshold, self.reset_after = threshold, reset_after
+        self.fails, self.opened_at = 0, None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if monotonic() - self.opened_at >= self.reset_after:
+                self.opened_at = monotonic()  # half-open: this caller probes, the rest wait another window
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.fails, self.opened_at = 0, None
+            else:
+                self.fails += 1
+                if self.fails >= self.threshold:
+                    self.opened_at = monotonic()
+
+_oanda_breaker = _Breaker()
+_dup_breaker = _Breaker()
 
 # ========== OANDA Execution ==========
 def place_oanda_order(symbol, action, units=1):
     if LOCAL_TEST or not FORWARD_TO_OANDA or not TRADING_ENABLED:
         return True, "OANDA not called (LOCAL_TEST / forwarding disabled / trading disabled)"
+    if not _oanda_breaker.allow():
+        return False, "❌ OANDA order skipped: circuit open"
     try:
-        client = oandapyV20.API(access_token=OANDA_TOKEN, environment="practice")
+        if not _oanda_client:
+            raise RuntimeError("Missing OANDA credentials")
         data = {
             "order": {
                 "instrument": symbol,
@@ -309,13 +711,19 @@ def place_oanda_order(symbol, action, units=1):
             }
         }
         r = orders.OrderCreate(accountID=OANDA_ACCOUNT_ID, data=data)
-        client.request(r)
+        _oanda_client.request(r)
+        _oanda_breaker.record(True)
         return True, "✅ OANDA order placed"
     except Exception as e:
+        # only outages count against the breaker; a rejected order (4xx) means OANDA is up
+        if isinstance(e, V20Error) and int(e.code) < 500:
+            _oanda_breaker.record(True)
+        elif isinstance(e, (requests.RequestException, V20Error)):
+            _oanda_breaker.record(False)
         return False, f"❌ OANDA order failed: {str(e)}"
 
 # ========== Duplikium Forward ==========
-def forward_to_duplikium(master_source, instrument, side, entry, sl_p, tp_p, units, tag="tv_v1"):
+def forward_to_duplikium(master_source, instrument, side, entry, sl_p, tp_p, units, tag="tv_v1", now_iso=None):
     if LOCAL_TEST or not FORWARD_TO_DUP or not TRADING_ENABLED:
         return True, 200, "Duplikium not called (LOCAL_TEST / forwarding disabled / trading disabled)"
     if not DUP_BASE:
@@ -331,128 +739,373 @@ def forward_to_duplikium(master_source, instrument, side, entry, sl_p, tp_p, uni
         "slPrice": sl_p,
         "tpPrice": tp_p,
         "clientOrderId": f"{tag}-{uuid.uuid4().hex[:8]}",
-        "comment": f"TV->{master_source} {datetime.now(timezone.utc).isoformat()}"
+        "comment": f"TV->{master_source} {now_iso or datetime.now(timezone.utc).isoformat()}"
     }
 
-    url = f"{DUP_BASE}{DUP_PATH}"
+    if not _dup_breaker.allow():
+        return False, 503, "circuit open"
     try:
-        resp = requests.post(url, json=payload, headers=dup_headers(), auth=dup_auth(), timeout=12)
+        resp = _dup_session.post(DUP_URL, data=json_bytes(payload), timeout=(CONNECT_TIMEOUT_SECS, DUP_READ_TIMEOUT_SECS))
+        _dup_breaker.record(resp.status_code < 500)
         return resp.ok, resp.status_code, resp.text
     except Exception as e:
+        _dup_breaker.record(False)
         return False, 500, str(e)
 
 # ========== Discord Notify ==========
-def notify_discord(title: str, fields: dict, color: int = 0x2ecc71):
-    """Post a clean embed to Discord (no-op if not configured)."""
-    if not DISCORD_WEBHOOK_SET or not DISCORD_WEBHOOK_URL:
-        return False, "discord disabled"
+DISCORD_BATCH_MAX    = 10     # Discord accepts up to 10 embeds per message
+DISCORD_BATCH_WINDOW = 0.1    # seconds to wait for more embeds before posting
+_discord_q = queue.Queue(maxsize=256)  # bounded: if Discord is down, drop embeds rather than grow forever
+
+def _post_discord(embeds):
     try:
-        embed_fields = [{"name": k, "value": str(v), "inline": True} for k, v in fields.items()]
-        payload = {
-            "embeds": [{
-                "title": title,
-                "color": color,
-                "fields": embed_fields,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }]
-        }
-        r = requests.post(DISCORD_WEBHOOK_URL, json=payload, timeout=8)
+        r = _discord_session.post(DISCORD_WEBHOOK_URL, data=json_bytes({"embeds": embeds}), timeout=8)
         return r.ok, r.text
     except Exception as e:
         return False, str(e)
 
+def _discord_worker():
+    """Coalesce embeds queued within DISCORD_BATCH_WINDOW into a single webhook post; a None ends it."""
+    while True:
+        embed = _discord_q.get()
+        if embed is None:
+            return
+        embeds, stop = [embed], False
+        deadline = time() + DISCORD_BATCH_WINDOW
+        while len(embeds) < DISCORD_BATCH_MAX:
+            remaining = deadline - time()
+            if remaining <= 0:
+                break
+            try:
+                embed = _discord_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if embed is None:
+                stop = True
+                break
+            embeds.append(embed)
+        _post_discord(embeds)
+        if stop:
+            return
+
+_discord_thread = threading.Thread(target=_discord_worker, name="discord", daemon=True)
+_discord_thread.start()
+
+def _drain_discord():
+    """At exit, let the worker post everything queued ahead of a stop marker (e.g. summaries of drained jobs)."""
+    try:
+        _discord_q.put(None, timeout=1)
+    except queue.Full:
+        pass
+    _discord_thread.join(timeout=10)
+
+atexit.register(_drain_discord)
+
+def notify_discord(title: str, fields: dict, color: int = 0x2ecc71, ts: str = None):
+    """Queue a clean embed for Discord (no-op if not configured)."""
+    if not DISCORD_WEBHOOK_SET or not DISCORD_WEBHOOK_URL:
+        return False, "discord disabled"
+    embed_fields = [{"name": k, "value": str(v), "inline": True} for k, v in fields.items()]
+    try:
+        _discord_q.put_nowait({
+            "title": title,
+            "color": color,
+            "fields": embed_fields,
+            "timestamp": ts or datetime.now(timezone.utc).isoformat()
+        })
+    except queue.Full:
+        return False, "discord queue full; embed dropped"
+    return True, "queued"
+
+def _reject_summarizer():
+    while True:
+        sleep(REJECT_SUMMARY_SECS)
+        with _reject_lock:
+            counts = dict(_reject_counter)
+            _reject_counter.clear()
+        if counts:
+            notify_discord("⛔ Rejected Signals", counts, color=0xe67e22)
+
+threading.Thread(target=_reject_summarizer, name="reject-summary", daemon=True).start()
+
+# ========== Outbound Workers ==========
+# Broker calls run on a small worker pool so the webhook can ack without waiting on
+# OANDA/Duplikium. WEBHOOK_ACK_WAIT_SECS > 0 waits that long for the full result first.
+OUTBOUND_WORKERS      = int(os.getenv("OUTBOUND_WORKERS", "4"))
+WEBHOOK_ACK_WAIT_SECS = float(os.getenv("WEBHOOK_ACK_WAIT_SECS", "0"))
+# Executor workers are joined at interpreter exit after finishing every queued job, and
+# that happens before atexit handlers run: a shutdown/deploy completes the orders already
+# acked with 202 before the logs are closed (gunicorn's graceful_timeout bounds the wait).
+# Jobs that start after shutdown has begun can't submit to _broker_pool any more, so
+# execute_signal runs their Duplikium leg inline; their Discord summaries go out via _drain_discord.
+_outbound_pool = ThreadPoolExecutor(max_workers=OUTBOUND_WORKERS, thread_name_prefix="outbound")
+
+# second leg of each signal (Duplikium) runs here so it overlaps the OANDA call; a separate
+# pool, since outbound jobs block on these futures and must not wait behind themselves
+_broker_pool = ThreadPoolExecutor(max_workers=OUTBOUND_WORKERS, thread_name_prefix="broker")
+# Worst case for one Duplikium POST: every connect attempt times out, plus the retry
+# backoffs, plus the full read. Waiting any less would report a 504 while the order is
+# still in flight and may fill.
+BROKER_TIMEOUT_SECS = (CONNECT_TIMEOUT_SECS * (_DUP_RETRY.total + 1)
+                       + _DUP_RETRY.backoff_factor * (2 ** _DUP_RETRY.total - 1)
+                       + DUP_READ_TIMEOUT_SECS + 1)
+
+def _report_job_error(fut: Future):
+    """Done-callback for jobs that were acked with 202: nobody awaits them, so surface failures on Discord."""
+    exc = fut.exception()
+    if exc is not None:
+        notify_discord("❌ Execution Exception", {"error": str(exc)}, color=0xe74c3c)
+
+def execute_signal(tv_symbol, instrument, side, price, sl_p, tp_p, units, risk_pct_applied, now_iso=None):
+    """Send the order to OANDA and Duplikium concurrently, post the Discord summary; returns (body, http_status)."""
+    dup_args = (MASTER_SRC, instrument, side, price, sl_p, tp_p, units)
+    try:
+        dup_fut = _broker_pool.submit(forward_to_duplikium, *dup_args, now_iso=now_iso)
+    except RuntimeError:  # interpreter shutting down: executors refuse new futures, so run the leg inline
+        dup_fut = None
+    oanda_ok, oanda_msg = place_oanda_order(instrument, side, units=units)
+    if dup_fut is None:
+        dup_ok, dup_status, dup_msg = forward_to_duplikium(*dup_args, now_iso=now_iso)
+    else:
+        try:
+            dup_ok, dup_status, dup_msg = dup_fut.result(timeout=BROKER_TIMEOUT_SECS)
+        except FutureTimeout:
+            dup_ok, dup_status, dup_msg = False, 504, "Duplikium forward timed out"
+
+    status = 'ok' if (oanda_ok and dup_ok) else 'partial' if (oanda_ok or dup_ok) else 'error'
+
+    notify_discord(
+        "📈 New Signal" if status != 'error' else "❌ Execution Error",
+        {
+            "status": status,
+            "symbol": tv_symbol,
+            "instrument": instrument,
+            "side": side,
+            "price": price,
+            "units": units,
+            "risk_pct": risk_pct_applied,
+            "sl": sl_p, "tp": tp_p,
+            "oanda": oanda_msg,
+            "duplikium_status": dup_status,
+        },
+        color=(0x2ecc71 if status == 'ok' else 0xf39c12 if status == 'partial' else 0xe74c3c),
+        ts=now_iso
+    )
+
+    return {
+        'status': status,
+        'LOCAL_TEST': LOCAL_TEST,
+        'TRADING_ENABLED': TRADING_ENABLED,
+        'risk_pct_applied': risk_pct_applied,
+        'oanda': oanda_msg,
+        'duplikium_status': dup_status,
+        'duplikium_msg': dup_msg,
+        'sent_units': units,
+        'tv_symbol': tv_symbol,
+        'instrument': instrument,
+        'slPrice': sl_p, 'tpPrice': tp_p
+    }, 200 if status != 'error' else 500
+
 # ========== Idempotency (avoid duplicate fills) ==========
-LAST_SEEN = {}
+LAST_SEEN = OrderedDict()  # order_id -> first-seen monotonic time, oldest first
 ID_TTL = 90  # seconds
+SEEN_MAX = 10_000
+_seen_lock = threading.Lock()
 
 def seen(order_id: str) -> bool:
-    now = time()
-    # purge old
-    for k, t in list(LAST_SEEN.items()):
-        if now - t > ID_TTL:
-            LAST_SEEN.pop(k, None)
-    if not order_id:
+    now = monotonic()  # immune to wall-clock steps, which would break the arrival ordering
+    with _seen_lock:
+        # purge old: entries are in arrival order, so stop at the first live one
+        while LAST_SEEN:
+            oldest = next(iter(LAST_SEEN))
+            if now - LAST_SEEN[oldest] <= ID_TTL:
+                break
+            LAST_SEEN.popitem(last=False)
+        if not order_id:
+            return False
+        if order_id in LAST_SEEN:
+            return True
+        LAST_SEEN[order_id] = now
+        if len(LAST_SEEN) > SEEN_MAX:
+            LAST_SEEN.popitem(last=False)
         return False
-    if order_id in LAST_SEEN:
-        return True
-    LAST_SEEN[order_id] = now
-    return False
 
 # ========== Routes ==========
 @app.route('/')
 def home():
     return "✅ Trade Execution Server is running"
 
+def _mask(v):
+    if not v: return None
+    return v[:4] + "..." + v[-4:] if len(v) > 8 else "***"
+
+def _parse_json():
+    """Request body as JSON (orjson when available) without caching the raw bytes; None like get_json(silent=True)."""
+    if not request.is_json:
+        return None
+    try:
+        return json_load(request.get_data(cache=False))
+    except ValueError:  # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+        return None
+
+# Config is fixed for the life of the process, so /env-check is rendered once.
+_ENV_CHECK_JSON = app.json.response({
+    "LOCAL_TEST": LOCAL_TEST,
+    "TRADING_ENABLED": TRADING_ENABLED,
+    "DAILY_LOSS_STOP_PCT": DAILY_LOSS_STOP_PCT,
+    "TRADING_TZ": TRADING_TZ,
+    "TRADING_WINDOW": TRADING_WINDOW,
+    "MAX_RISK_PCT": MAX_RISK_PCT,
+    "MAX_UNITS": MAX_UNITS,
+    "MASTER_START_BAL": MASTER_START_BAL,
+    "FORWARD_TO_OANDA": FORWARD_TO_OANDA,
+    "FORWARD_TO_DUPLIKIUM": FORWARD_TO_DUP,
+    "OANDA_ACCOUNT_ID": OANDA_ACCOUNT_ID,
+    "OANDA_TOKEN": _mask(OANDA_TOKEN),
+    "DUPLIKIUM_BASE": DUP_BASE,
+    "DUPLIKIUM_USER": DUP_USER,
+    "DUPLIKIUM_TOKEN": _mask(DUP_TOKEN),
+    "DUPLIKIUM_AUTH_STYLE": DUP_AUTH,
+    "DUPLIKIUM_ORDERS_PATH": DUP_PATH,
+    "SYMBOL_ALLOWLIST": SYMBOL_ALLOWLIST,
+    "SYMBOL_RISK_CAPS": SYMBOL_RISK_CAPS,
+    "DISCORD_WEBHOOK_SET": DISCORD_WEBHOOK_SET
+}).get_data()
+
+_RISK_STATIC = {
+    "MAX_RISK_PCT": MAX_RISK_PCT,
+    "MAX_UNITS": MAX_UNITS,
+    "SYMBOL_ALLOWLIST": SYMBOL_ALLOWLIST,
+    "SYMBOL_RISK_CAPS": SYMBOL_RISK_CAPS,
+}
+
+_risk_status = {"ts": None, "body": None}
+
 @app.route('/env-check')
 def env_check():
-    def mask(v):
-        if not v: return None
-        return v[:4] + "..." + v[-4:] if len(v) > 8 else "***"
-    return jsonify({
-        "LOCAL_TEST": LOCAL_TEST,
-        "TRADING_ENABLED": TRADING_ENABLED,
-        "DAILY_LOSS_STOP_PCT": DAILY_LOSS_STOP_PCT,
-        "TRADING_TZ": TRADING_TZ,
-        "TRADING_WINDOW": TRADING_WINDOW,
-        "MAX_RISK_PCT": MAX_RISK_PCT,
-        "MAX_UNITS": MAX_UNITS,
-        "MASTER_START_BAL": MASTER_START_BAL,
-        "FORWARD_TO_OANDA": FORWARD_TO_OANDA,
-        "FORWARD_TO_DUPLIKIUM": FORWARD_TO_DUP,
-        "OANDA_ACCOUNT_ID": OANDA_ACCOUNT_ID,
-        "OANDA_TOKEN": mask(OANDA_TOKEN),
-        "DUPLIKIUM_BASE": DUP_BASE,
-        "DUPLIKIUM_USER": DUP_USER,
-        "DUPLIKIUM_TOKEN": mask(DUP_TOKEN),
-        "DUPLIKIUM_AUTH_STYLE": DUP_AUTH,
-        "DUPLIKIUM_ORDERS_PATH": DUP_PATH,
-        "SYMBOL_ALLOWLIST": SYMBOL_ALLOW,
-        "SYMBOL_RISK_CAPS": SYMBOL_RISK_CAPS,
-        "DISCORD_WEBHOOK_SET": DISCORD_WEBHOOK_SET
-    })
+    return Response(_ENV_CHECK_JSON, mimetype="application/json")
 
 @app.route('/risk-status')
 def risk_status():
-    bal = get_oanda_balance()
-    now_utc = datetime.now(timezone.utc)
-    tw_ok = trading_window_ok(now_utc)
-    dl_ok, dl_info = daily_loss_guard(now_utc)
-    return jsonify({
-        "oanda_balance": bal,
-        "MAX_RISK_PCT": MAX_RISK_PCT,
-        "MAX_UNITS": MAX_UNITS,
-        "SYMBOL_ALLOWLIST": SYMBOL_ALLOW,
-        "SYMBOL_RISK_CAPS": SYMBOL_RISK_CAPS,
-        "trading_window_ok": tw_ok,
-        "daily_loss_ok": dl_ok,
-        "daily_loss_info": dl_info
-    })
+    # scraped by monitors far more often than NAV refreshes; one rendered body serves a 5s window
+    now = monotonic()
+    if _risk_status["ts"] is None or now - _risk_status["ts"] >= 5:
+        bal, age = get_oanda_balance(), nav_age_secs()
+        now_utc = datetime.now(timezone.utc)
+        tw_ok = trading_window_ok(now_utc)
+        dl_ok, dl_info = daily_loss_guard(now_utc)
+        _risk_status["body"] = app.json.response({
+            **_RISK_STATIC,
+            "oanda_balance": bal,
+            "nav_age_secs": None if age is None else round(age, 1),
+            "trading_window_ok": tw_ok,
+            "daily_loss_ok": dl_ok,
+            "daily_loss_info": dl_info
+        }).get_data()
+        _risk_status["ts"] = now
+    return Response(_risk_status["body"], mimetype="application/json")
+
+_csv_downloads = {}  # filename -> (source key, raw body, gzip body, etag)
+
+def _csv_attachment(filename, key, render):
+    """CSV attachment with ETag/304 support, gzip-encoded when accepted; re-rendered only when key changes."""
+    hit = _csv_downloads.get(filename)
+    if hit is None or hit[0] != key:
+        raw = render()
+        hit = (key, raw, gzip.compress(raw, 6), hashlib.sha1(raw).hexdigest())
+        _csv_downloads[filename] = hit
+    _, raw, gz, etag = hit
+    use_gzip = "gzip" in request.accept_encodings
+    resp = Response(gz if use_gzip else raw, mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename={filename}", "Vary": "Accept-Encoding",
+                             "Cache-Control": "no-cache"})
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.set_etag(etag + ("-gz" if use_gzip else ""))
+    return resp.make_conditional(request)
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
 
 @app.route('/download/trades')
 def download_trades():
-    if not os.path.exists(trade_log_file):
-        return jsonify({'status': 'error', 'message': 'Trades file not found'}), 404
-    return send_file(trade_log_file, as_attachment=True)
+    flush_logs()
+    if "gzip" not in request.accept_encodings:
+        # uncompressed: hand the file to the WSGI server (wsgi.file_wrapper -> sendfile, or X-Sendfile)
+        resp = send_file(trade_log_file, mimetype="text/csv", as_attachment=True, conditional=True)
+        resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    return _csv_attachment("simulated_trades.csv", _log_key("trades"), lambda: _read_bytes(trade_log_file))
+
+_trades_parquet = {"key": None, "body": None}
+
+@app.route('/download/trades.parquet')
+def download_trades_parquet():
+    """Trade log as Snappy Parquet for the dashboard; re-encoded only when the CSV has changed."""
+    flush_logs()
+    key = _log_key("trades")
+    if _trades_parquet["key"] != key:
+        try:
+            import pandas as pd  # only this route needs pandas/pyarrow
+            buf = io.BytesIO()
+            pd.read_csv(trade_log_file, parse_dates=["Time"]).to_parquet(buf, compression="snappy", index=False)
+        except ImportError:
+            return jsonify({'status': 'error', 'message': 'Parquet export unavailable (pyarrow not installed)'}), 501
+        _trades_parquet.update(key=key, body=buf.getvalue())
+    return Response(_trades_parquet["body"], mimetype="application/vnd.apache.parquet")
 
 @app.route('/download/equity')
 def download_equity():
-    if not os.path.exists(equity_file):
-        return jsonify({'status': 'error', 'message': 'Equity file not found'}), 404
-    return send_file(equity_file, as_attachment=True)
+    key, ts, eq = _load_equity_np()
+
+    def render():
+        out = io.StringIO()
+        w = csv.writer(out)
+        w.writerow(["Time", "Equity"])
+        w.writerows(zip(np.datetime_as_string(ts, unit="us").tolist(), eq.tolist()))
+        return out.getvalue().encode()
+    return _csv_attachment("equity_curve.csv", key, render)
+
+@app.route('/equity-stats')
+def equity_stats_route():
+    return jsonify(equity_stats())
+
+@app.route('/admin/rebuild-equity', methods=['POST'])
+def rebuild_equity_route():
+    """
+    Regenerate the equity curve from simulated_trades.csv (e.g. after editing the trade log).
+    Replaces the whole equity history, including migrated legacy points and anything from
+    rotated trade logs; the previous log is kept as equity_curve.bin.bak.
+    """
+    try:
+        points = rebuild_equity_curve()
+    except (OSError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({'status': 'ok', 'points': points, 'equity': current_equity})
+
+# listdir + stats are cheap but this gets polled; one snapshot serves a 5s window
+_debug_files = {"ts": None, "body": None}
 
 @app.route('/debug/files')
 def debug_files():
-    return jsonify({
-        "files": os.listdir(BASE_DIR),
-        "equity_file_exists": os.path.exists(equity_file),
-        "trades_file_exists": os.path.exists(trade_log_file),
-        "daily_nav_file_exists": os.path.exists(daily_nav_file)
-    })
+    now = monotonic()
+    if _debug_files["ts"] is None or now - _debug_files["ts"] >= 5:
+        _debug_files["body"] = {
+            "files": os.listdir(BASE_DIR),
+            "equity_file_exists": os.path.exists(equity_bin_file),
+            "trades_file_exists": os.path.exists(trade_log_file),
+            "rejections_file_exists": os.path.exists(reject_log_file),
+            "daily_nav_file_exists": os.path.exists(daily_nav_file)
+        }
+        _debug_files["ts"] = now
+    return jsonify(_debug_files["body"])
 
 @app.route('/dryrun', methods=['POST'])
 def dryrun():
     """Compute mapping, sizing, SL/TP — no orders sent; logs locally."""
-    data = request.get_json(silent=True) or {}
+    data = _parse_json() or {}
     action = (data.get('action') or data.get('signal') or "BUY_SIGNAL").upper()
     side = "BUY" if "BUY" in action else "SELL"
     tv_symbol = (data.get('symbol') or "US30").upper()
@@ -498,11 +1151,32 @@ def dryrun():
         "open_positions_total": 0
     })
 
+# The fixed /webhook replies never change either, so they are rendered once as well.
+_WEBHOOK_CANNED = {
+    key: (app.json.response(body).get_data(), code)
+    for key, body, code in [
+        ("no_data",   {'status': 'error', 'message': 'No data received'}, 400),
+        ("missing",   {'status': 'error', 'message': 'Missing side/symbol'}, 400),
+        ("duplicate", {'status': 'ignored', 'reason': 'duplicate order_id'}, 200),
+        ("window",    {'status': 'skipped', 'reason': 'outside trading window'}, 200),
+        ("disabled",  {'status': 'skipped', 'reason': 'TRADING_ENABLED=false'}, 200),
+    ]
+}
+
+def _canned(key):
+    body, code = _WEBHOOK_CANNED[key]
+    return Response(body, status=code, mimetype="application/json")
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    data = request.get_json(silent=True)
+    data = _parse_json()
     if not data:
-        return jsonify({'status': 'error', 'message': 'No data received'}), 400
+        return _canned("no_data")
+
+    # one clock read per signal: UTC for guards/broker payloads, naive local for the logs
+    now_utc = datetime.now(timezone.utc)
+    now_iso = now_utc.isoformat()
+    now_local = now_utc.astimezone().replace(tzinfo=None)
 
     try:
         # accept either {action:"BUY"...} or {signal:"BUY_SIGNAL"...}
@@ -510,7 +1184,7 @@ def webhook():
         side = "BUY" if "BUY" in action else "SELL" if "SELL" in action else None
         tv_symbol = (data.get('symbol') or "").upper()
         if not side or not tv_symbol:
-            return jsonify({'status': 'error', 'message': 'Missing side/symbol'}), 400
+            return _canned("missing")
         if tv_symbol not in SYMBOL_ALLOW:
             return jsonify({'status': 'error', 'message': f'Symbol {tv_symbol} not allowed'}), 400
 
@@ -519,31 +1193,21 @@ def webhook():
 
         # Idempotency
         if seen(order_id):
-            return jsonify({'status': 'ignored', 'reason': 'duplicate order_id'}), 200
+            return _canned("duplicate")
 
         # Trading window & daily drawdown guard
-        now_utc = datetime.now(timezone.utc)
         if not trading_window_ok(now_utc):
-            save_trade_to_csv(tv_symbol, side, price, order_id)  # still log
-            notify_discord("⛔ Blocked by Trading Window", {
-                "symbol": tv_symbol, "side": side, "price": price, "order_id": order_id
-            }, color=0xe67e22)
-            return jsonify({'status': 'skipped', 'reason': 'outside trading window'}), 200
+            record_rejection("trading_window", tv_symbol, side, price, order_id, now_local)  # still log
+            return _canned("window")
 
         dl_ok, dl_info = daily_loss_guard(now_utc)
         if not dl_ok:
-            save_trade_to_csv(tv_symbol, side, price, order_id)
-            notify_discord("⛔ Blocked by Daily Loss Stop", {
-                "symbol": tv_symbol, "side": side, "price": price, **dl_info
-            }, color=0xe74c3c)
+            record_rejection("daily_loss", tv_symbol, side, price, order_id, now_local)
             return jsonify({'status': 'skipped', 'reason': 'daily loss stop hit', 'daily_loss_info': dl_info}), 200
 
         if not TRADING_ENABLED:
-            save_trade_to_csv(tv_symbol, side, price, order_id)
-            notify_discord("⚠️ Trading Disabled", {
-                "symbol": tv_symbol, "side": side, "price": price, "order_id": order_id
-            }, color=0xf1c40f)
-            return jsonify({'status': 'skipped', 'reason': 'TRADING_ENABLED=false'}), 200
+            record_rejection("trading_disabled", tv_symbol, side, price, order_id, now_local)
+            return _canned("disabled")
 
         # optional SL/TP & risk from payload
         sl_type = (data.get('sl_type') or "points")
@@ -570,51 +1234,42 @@ def webhook():
         units = size_for_risk(tv_symbol, balance, risk_pct_applied, price, sl_p)
 
         # log locally
-        save_trade_to_csv(tv_symbol, side, price, order_id)
-        simulate_equity(price, side)
-
-        # execute
-        oanda_ok, oanda_msg = place_oanda_order(instrument, side, units=units)
-        dup_ok, dup_status, dup_msg = forward_to_duplikium(MASTER_SRC, instrument, side, price, sl_p, tp_p, units)
-
-        status = 'ok' if (oanda_ok and dup_ok) else 'partial' if (oanda_ok or dup_ok) else 'error'
-
-        # Discord notify
-        notify_discord(
-            "📈 New Signal" if status != 'error' else "❌ Execution Error",
-            {
-                "status": status,
-                "symbol": tv_symbol,
-                "instrument": instrument,
-                "side": side,
-                "price": price,
-                "units": units,
-                "risk_pct": risk_pct_applied,
-                "sl": sl_p, "tp": tp_p,
-                "oanda": oanda_msg,
-                "duplikium_status": dup_status,
-            },
-            color=(0x2ecc71 if status == 'ok' else 0xf39c12 if status == 'partial' else 0xe74c3c)
-        )
-
-        return jsonify({
-            'status': status,
-            'LOCAL_TEST': LOCAL_TEST,
-            'TRADING_ENABLED': TRADING_ENABLED,
-            'risk_pct_applied': risk_pct_applied,
-            'oanda': oanda_msg,
-            'duplikium_status': dup_status,
-            'duplikium_msg': dup_msg,
-            'sent_units': units,
-            'tv_symbol': tv_symbol,
-            'instrument': instrument,
-            'slPrice': sl_p, 'tpPrice': tp_p
-        }), 200 if status != 'error' else 500
+        # mark the previous trade to this price before this one becomes _last_trade
+        simulate_equity(price, side, now_local)
+        save_trade_to_csv(tv_symbol, side, price, order_id, now_local)
+
+        # execute off the request thread; ack with 202 unless the result arrives in time
+        job = _outbound_pool.submit(execute_signal, tv_symbol, instrument, side, price, sl_p, tp_p, units, risk_pct_applied, now_iso)
+        try:
+            body, code = job.result(timeout=WEBHOOK_ACK_WAIT_SECS)
+        except FutureTimeout:
+            job.add_done_callback(_report_job_error)
+            return jsonify({
+                'status': 'accepted',
+                'order_id': order_id,
+                'LOCAL_TEST': LOCAL_TEST,
+                'risk_pct_applied': risk_pct_applied,
+                'sent_units': units,
+                'tv_symbol': tv_symbol,
+                'instrument': instrument,
+                'slPrice': sl_p, 'tpPrice': tp_p
+            }), 202
+        return jsonify(body), code
 
     except Exception as e:
-        notify_discord("❌ Webhook Exception", {"error": str(e)}, color=0xe74c3c)
+        notify_discord("❌ Webhook Exception", {"error": str(e)}, color=0xe74c3c, ts=now_iso)
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# === Run (local dev) ===
+# === Run ===
+# Production: `gunicorn main:app` (see gunicorn.conf.py). `python main.py` serves with
+# waitress' thread pool when installed; FLASK_DEBUG=1 gives the reloading dev server.
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    port = int(os.getenv("PORT", "8080"))
+    if os.getenv("FLASK_DEBUG", "").lower() in ("1", "true"):
+        app.run(host='0.0.0.0', port=port, debug=True)
+    else:
+        try:
+            from waitress import serve
+            serve(app, host='0.0.0.0', port=port, threads=16)
+        except ImportError:
+            app.run(host='0.0.0.0', port=port, threaded=True)
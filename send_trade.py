@@ -16,7 +16,7 @@ trade_data = {
 def send_trade(data):
     try:
         response = requests.post(WEBHOOK_URL, json=data)
-        if response.status_code == 200:
+        if response.ok:
             print("✅ Trade sent successfully!")
             print(response.json())
         else: